@@ -2,38 +2,250 @@ import os
 import json
 import hashlib
 import hmac
+import functools
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
+import re
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+import orjson
 from flask import Flask, request, jsonify
-from datetime import datetime
-from typing import Dict, List, Optional
-import openai
+from flask.json.provider import JSONProvider
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from openai import OpenAI
 from github import Github
+from redis import Redis, RedisError
+from rq import Queue
 import difflib
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider that parses and serializes with orjson"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round-trip of the default response
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Configuration
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 GITHUB_WEBHOOK_SECRET = os.getenv('GITHUB_WEBHOOK_SECRET')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+GITHUB_CACHE_TTL = int(os.getenv('GITHUB_CACHE_TTL', 600))
+GITHUB_CACHE_MAXSIZE = int(os.getenv('GITHUB_CACHE_MAXSIZE', 512))
+GITHUB_API_URL = 'https://api.github.com'
+GITHUB_GRAPHQL_URL = f'{GITHUB_API_URL}/graphql'
+GITHUB_PER_PAGE = 100  # GitHub's maximum page size
+GITHUB_MAX_WORKERS = 4
+GITHUB_ETAG_MAXSIZE = 256  # REST responses kept for If-None-Match revalidation
+MAX_DIFF_BYTES = 3000  # Diff size sent to the LLM
+REDIS_URL = os.getenv('REDIS_URL')
+REVIEW_JOB_TIMEOUT = 600
+REVIEW_RESULT_TTL = 3600
+REVIEW_REPLAY_TTL = int(os.getenv('REVIEW_REPLAY_TTL', 30))
+REDIS_CACHE_PREFIX = 'pr-reviewer:cache:'
+REDIS_ETAG_PREFIX = 'pr-reviewer:etag:'
+REDIS_CLAIM_PREFIX = 'pr-reviewer:claim:'
+MAX_WEBHOOK_PAYLOAD_BYTES = 1_000_000  # Typical PR webhooks are under 100 KB
+
+# Also caps bodies sent without a Content-Length header
+app.config['MAX_CONTENT_LENGTH'] = MAX_WEBHOOK_PAYLOAD_BYTES
+
+# Shared Redis connection for the review queue and the cross-process cache
+redis_conn = Redis.from_url(REDIS_URL) if REDIS_URL else None
 
 # Initialize GitHub client
 github_client = Github(GITHUB_TOKEN) if GITHUB_TOKEN else None
 
+# Shared HTTP session so GitHub calls reuse pooled TCP/TLS connections
+github_session = requests.Session()
+github_session.headers['Accept'] = 'application/vnd.github+json'
+if GITHUB_TOKEN:
+    github_session.headers['Authorization'] = f'token {GITHUB_TOKEN}'
+github_session.mount('https://', HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3)
+))
+
+# Title, body, head commit and changed files of a PR in one round-trip
+PR_BUNDLE_QUERY = """
+query($owner: String!, $name: String!, $number: Int!) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      title
+      body
+      headRefOid
+      author { login __typename }
+      files(first: 100) {
+        pageInfo { hasNextPage }
+        nodes { path additions deletions changeType }
+      }
+    }
+  }
+}
+"""
+
+# GraphQL PatchStatus -> REST file status
+CHANGE_TYPE_STATUS = {
+    'ADDED': 'added',
+    'DELETED': 'removed',
+    'MODIFIED': 'modified',
+    'RENAMED': 'renamed',
+    'COPIED': 'copied',
+    'CHANGED': 'changed',
+}
+
+# Files that bot PRs commonly touch and that are not worth an LLM review
+LOW_VALUE_FILE_SUFFIXES = ('.lock', 'lock.json', '.md')
+
+# Basic check patterns
+CODE_EXTENSIONS = ('.py', '.js', '.ts', '.java', '.cpp')
+# All sensitive keywords in one precompiled alternation, scanned in a single
+# pass per name; an Aho-Corasick automaton gains nothing over five keywords
+SENSITIVE_FILE_RE = re.compile(r'\.env|config|secret|key|password')
+
+# LLM prompts. The invariant instructions come first and the per-PR
+# context after them, so every review shares the same prompt prefix.
+SYSTEM_PROMPT = "You are an expert code reviewer providing constructive feedback on pull requests."
+
+REVIEW_INSTRUCTIONS = """As an expert code reviewer, analyze this pull request and provide feedback on:
+
+1. Code Quality & Best Practices
+2. Potential Bugs or Issues
+3. Security Concerns
+4. Performance Implications
+5. Documentation & Comments
+6. Testing Coverage
+
+Please be constructive and specific in your feedback. If the code looks good, mention what's done well."""
+
 # Initialize OpenAI client
-if OPENAI_API_KEY:
-    openai.api_key = OPENAI_API_KEY
+openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+
+def cached_by_head_sha(method):
+    """Memoize a GitHub fetch per (repo, PR number, head SHA).
+
+    A new push changes the head SHA, so cached entries never go stale; calls
+    without a head SHA bypass the cache. Empty results are not cached.
+    """
+    @functools.wraps(method)
+    def wrapper(self, repo_name: str, pr_number: int, head_sha: Optional[str] = None):
+        if not head_sha:
+            return method(self, repo_name, pr_number, head_sha)
+
+        key = (method.__name__, repo_name, pr_number, head_sha)
+        value = self._cache_get(key)
+        if value is None:
+            value = method(self, repo_name, pr_number, head_sha)
+            if value:
+                self._cache_set(key, value)
+        return value
+    return wrapper
 
 class PRReviewer:
     def __init__(self):
         self.github = github_client
         self.model = OPENAI_MODEL
+        # With Redis, cached values are shared by every gunicorn worker and
+        # RQ job (RQ forks a process per job); otherwise they are per process
+        self.redis = redis_conn
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # ETag-validated responses are kept apart so large file listings do
+        # not evict PR data or LLM results, and revalidations (which still
+        # hit the network) are not counted as cache hits
+        self._etags = OrderedDict()
+        self._inflight = {}  # Replay key -> Future of the review in progress
+        self.stats = {'cache_hits': 0, 'cache_misses': 0}
+
+    def _redis_get(self, key: str):
+        """Return a JSON value stored in Redis, or None if missing or unreachable"""
+        try:
+            raw = self.redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Redis cache read failed: {e}")
+            return None
+        return orjson.loads(raw) if raw is not None else None
+
+    def _redis_set(self, key: str, value, ttl: int):
+        """Store a JSON value in Redis with an expiry"""
+        try:
+            self.redis.setex(key, ttl, orjson.dumps(value))
+        except RedisError as e:
+            logger.warning(f"Redis cache write failed: {e}")
+
+    def _cache_get(self, key):
+        """Return a cached value, or None if missing or expired"""
+        if self.redis is not None:
+            value = self._redis_get(REDIS_CACHE_PREFIX + orjson.dumps(key).decode('utf-8'))
+            with self._cache_lock:
+                self.stats['cache_hits' if value is not None else 'cache_misses'] += 1
+            return value
+        
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._cache.pop(key, None)
+                self.stats['cache_misses'] += 1
+                return None
+            self._cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return entry[1]
+
+    def _cache_set(self, key, value, ttl: int = GITHUB_CACHE_TTL):
+        """Store a value in the LRU cache, evicting the oldest entries"""
+        if self.redis is not None:
+            self._redis_set(REDIS_CACHE_PREFIX + orjson.dumps(key).decode('utf-8'), value, ttl)
+            return
+        
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > GITHUB_CACHE_MAXSIZE:
+                self._cache.popitem(last=False)
+
+    def _etag_get(self, key):
+        """Return a stored (etag, body, links) entry, or None"""
+        if self.redis is not None:
+            return self._redis_get(REDIS_ETAG_PREFIX + orjson.dumps(key).decode('utf-8'))
+        
+        with self._cache_lock:
+            entry = self._etags.get(key)
+            if entry is not None:
+                self._etags.move_to_end(key)
+            return entry
+
+    def _etag_set(self, key, entry):
+        """Store an (etag, body, links) entry, evicting the oldest ones"""
+        if self.redis is not None:
+            self._redis_set(REDIS_ETAG_PREFIX + orjson.dumps(key).decode('utf-8'), entry, GITHUB_CACHE_TTL)
+            return
+        
+        with self._cache_lock:
+            self._etags[key] = entry
+            self._etags.move_to_end(key)
+            while len(self._etags) > GITHUB_ETAG_MAXSIZE:
+                self._etags.popitem(last=False)
 
     def verify_signature(self, payload_body: bytes, signature_header: str) -> bool:
         """Verify GitHub webhook signature"""
@@ -41,99 +253,177 @@ class PRReviewer:
             logger.warning("GitHub webhook secret not configured")
             return True  # Skip verification in demo mode
         
-        signature = hmac.new(
-            GITHUB_WEBHOOK_SECRET.encode('utf-8'),
-            payload_body,
-            hashlib.sha256
-        ).hexdigest()
+        # Reject malformed headers before hashing the payload
+        if not signature_header.startswith('sha256=') or len(signature_header) != 71:
+            return False
+        try:
+            provided = bytes.fromhex(signature_header[7:])
+        except ValueError:
+            return False
         
-        expected_signature = f"sha256={signature}"
-        return hmac.compare_digest(expected_signature, signature_header)
+        expected = hmac.digest(GITHUB_WEBHOOK_SECRET.encode('utf-8'), payload_body, 'sha256')
+        return hmac.compare_digest(expected, provided)
+
+    @cached_by_head_sha
+    def fetch_pr_bundle(self, repo_name: str, pr_number: int, head_sha: Optional[str] = None) -> Dict:
+        """Get PR metadata and changed files with a single GraphQL query"""
+        try:
+            owner, name = repo_name.split('/', 1)
+            response = github_session.post(GITHUB_GRAPHQL_URL, json={
+                'query': PR_BUNDLE_QUERY,
+                'variables': {'owner': owner, 'name': name, 'number': pr_number}
+            })
+            response.raise_for_status()
+            result = response.json()
+            if result.get('errors'):
+                raise RuntimeError(result['errors'][0].get('message', 'GraphQL error'))
+
+            pr = result['data']['repository']['pullRequest']
+            files = [{
+                'filename': node['path'],
+                'status': CHANGE_TYPE_STATUS.get(node['changeType'], node['changeType'].lower()),
+                'additions': node['additions'],
+                'deletions': node['deletions'],
+                'changes': node['additions'] + node['deletions'],
+                'patch': None
+            } for node in pr['files']['nodes']]
+
+            # GraphQL caps a page at 100 files; larger PRs use the REST listing
+            if pr['files']['pageInfo']['hasNextPage']:
+                files = self.get_pr_files(repo_name, pr_number, head_sha)
 
-    def get_pr_diff(self, repo_name: str, pr_number: int) -> str:
+            return {
+                'title': pr['title'],
+                'body': pr['body'] or '',
+                'author': (pr.get('author') or {}).get('login', ''),
+                'author_is_bot': (pr.get('author') or {}).get('__typename') == 'Bot',
+                'head_sha': pr['headRefOid'],
+                'files': files
+            }
+        except Exception as e:
+            logger.error(f"Error getting PR bundle: {e}")
+            return {}
+
+    @cached_by_head_sha
+    def get_pr_diff(self, repo_name: str, pr_number: int, head_sha: Optional[str] = None) -> str:
         """Get the diff for a pull request"""
         try:
-            repo = self.github.get_repo(repo_name)
-            pr = repo.get_pull(pr_number)
-            
-            # Get the diff
-            diff_url = pr.diff_url
-            headers = {'Authorization': f'token {GITHUB_TOKEN}'}
-            response = requests.get(diff_url, headers=headers)
+            # Ask the API for the diff directly and read only what the LLM
+            # prompt will use instead of buffering the whole diff
+            url = f"{GITHUB_API_URL}/repos/{repo_name}/pulls/{pr_number}"
+            headers = {'Accept': 'application/vnd.github.v3.diff'}
+            with github_session.get(url, headers=headers, stream=True) as response:
+                if response.status_code != 200:
+                    return ""
+                head = response.raw.read(MAX_DIFF_BYTES, decode_content=True)
             
-            return response.text if response.status_code == 200 else ""
+            return head.decode('utf-8', errors='replace')
         except Exception as e:
             logger.error(f"Error getting PR diff: {e}")
             return ""
 
-    def get_pr_files(self, repo_name: str, pr_number: int) -> List[Dict]:
+    @cached_by_head_sha
+    def get_pr_files(self, repo_name: str, pr_number: int, head_sha: Optional[str] = None) -> List[Dict]:
         """Get changed files in a pull request"""
         try:
-            repo = self.github.get_repo(repo_name)
-            pr = repo.get_pull(pr_number)
-            
+            url = f"{GITHUB_API_URL}/repos/{repo_name}/pulls/{pr_number}/files"
+            first_page, links = self._get_files_page(url, 1)
+            pages = [first_page]
+
+            # The Link header gives the last page; fetch the rest concurrently
+            last_url = links.get('last', {}).get('url')
+            if last_url:
+                last_page = int(parse_qs(urlparse(last_url).query)['page'][0])
+                with ThreadPoolExecutor(max_workers=GITHUB_MAX_WORKERS) as executor:
+                    results = executor.map(
+                        lambda page: self._get_files_page(url, page),
+                        range(2, last_page + 1)
+                    )
+                    pages.extend(body for body, _ in results)
+
             files = []
-            for file in pr.get_files():
-                files.append({
-                    'filename': file.filename,
-                    'status': file.status,
-                    'additions': file.additions,
-                    'deletions': file.deletions,
-                    'changes': file.changes,
-                    'patch': file.patch if hasattr(file, 'patch') else None
-                })
+            for page in pages:
+                for file in page:
+                    files.append({
+                        'filename': file['filename'],
+                        'status': file['status'],
+                        'additions': file['additions'],
+                        'deletions': file['deletions'],
+                        'changes': file['changes'],
+                        'patch': file.get('patch')
+                    })
             
             return files
         except Exception as e:
             logger.error(f"Error getting PR files: {e}")
             return []
 
+    def _get_files_page(self, url: str, page: int) -> Tuple[List[Dict], Dict]:
+        """Get one page of a pull request's changed files and its links"""
+        return self._github_get(url, {'per_page': GITHUB_PER_PAGE, 'page': page})
+
+    def _github_get(self, url: str, params: Optional[Dict] = None) -> Tuple[object, Dict]:
+        """GET a GitHub API resource, revalidating cached copies with ETags.
+
+        A 304 Not Modified reply does not count against the rate limit, so
+        unchanged resources are served from the cache for free.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self._etag_get(key)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        
+        response = github_session.get(url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1], cached[2]
+        response.raise_for_status()
+        
+        body = response.json()
+        etag = response.headers.get('ETag')
+        if etag:
+            self._etag_set(key, (etag, body, response.links))
+        return body, response.links
+
     def analyze_code_with_llm(self, diff: str, files: List[Dict], pr_info: Dict) -> str:
         """Analyze code changes using LLM"""
         if not OPENAI_API_KEY:
             return "⚠️ LLM analysis unavailable - OpenAI API key not configured"
 
         try:
-            # Prepare context for LLM
-            context = f"""
-            Pull Request Analysis Request:
-            
-            PR Title: {pr_info.get('title', 'N/A')}
-            PR Description: {pr_info.get('body', 'N/A')}
-            
-            Files Changed: {len(files)}
-            {chr(10).join([f"- {f['filename']} ({f['status']})" for f in files[:10]])}
-            
-            Code Diff:
-            {diff[:3000]}  # Limit diff size for API
-            """
+            # Per-PR context follows the shared instructions; get_pr_diff
+            # already truncates the diff
+            context = f"""Code Diff:
+{diff}
 
-            prompt = f"""
-            As an expert code reviewer, analyze this pull request and provide feedback on:
-            
-            1. Code Quality & Best Practices
-            2. Potential Bugs or Issues
-            3. Security Concerns
-            4. Performance Implications
-            5. Documentation & Comments
-            6. Testing Coverage
-            
-            Please be constructive and specific in your feedback. If the code looks good, mention what's done well.
-            
-            {context}
-            """
+Files Changed: {len(files)}
+{chr(10).join([f"- {f['filename']} ({f['status']})" for f in files[:10]])}
+
+PR Title: {pr_info.get('title', 'N/A')}
+PR Description: {pr_info.get('body', 'N/A')}"""
+
+            prompt = f"{REVIEW_INSTRUCTIONS}\n\n{context}"
+
+            # Identical prompts at a near-zero temperature give the same
+            # answer, so reuse it instead of paying for another completion
+            cache_key = ('llm', hashlib.sha256(json.dumps(
+                {'m': self.model, 'p': prompt, 't': 0.1}, sort_keys=True
+            ).encode('utf-8')).hexdigest())
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
 
-            response = openai.ChatCompletion.create(
+            response = openai_client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "You are an expert code reviewer providing constructive feedback on pull requests."},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=1000,
                 temperature=0.1
             )
 
-            return response.choices[0].message.content
+            analysis = response.choices[0].message.content or ''
+            self._cache_set(cache_key, analysis)
+            return analysis
 
         except Exception as e:
             logger.error(f"Error analyzing code with LLM: {e}")
@@ -142,25 +432,31 @@ class PRReviewer:
     def perform_basic_checks(self, files: List[Dict]) -> List[str]:
         """Perform basic code quality checks"""
         issues = []
+        sensitive_issues = []
+        has_test_files = False
+        has_code_files = False
         
-        # Check for large files
+        # Single pass over the files, lowercasing each name once
         for file in files:
+            filename = file['filename']
+            name = filename.lower()
+            
+            # Check for large files
             if file['changes'] > 500:
-                issues.append(f"⚠️ Large changeset in {file['filename']} ({file['changes']} lines)")
+                issues.append(f"⚠️ Large changeset in {filename} ({file['changes']} lines)")
+            
+            has_test_files = has_test_files or 'test' in name
+            has_code_files = has_code_files or filename.endswith(CODE_EXTENSIONS)
+            
+            # Check for potential sensitive files
+            if SENSITIVE_FILE_RE.search(name):
+                sensitive_issues.append(f"🔒 Potentially sensitive file detected: {filename}")
         
         # Check for missing tests
-        has_test_files = any('test' in f['filename'].lower() for f in files)
-        has_code_files = any(f['filename'].endswith(('.py', '.js', '.ts', '.java', '.cpp')) for f in files)
-        
         if has_code_files and not has_test_files:
             issues.append("⚠️ Code changes detected but no test files added/modified")
         
-        # Check for potential sensitive files
-        sensitive_patterns = ['.env', 'config', 'secret', 'key', 'password']
-        for file in files:
-            if any(pattern in file['filename'].lower() for pattern in sensitive_patterns):
-                issues.append(f"🔒 Potentially sensitive file detected: {file['filename']}")
-        
+        issues.extend(sensitive_issues)
         return issues
 
     def post_review_comment(self, repo_name: str, pr_number: int, comment: str) -> bool:
@@ -182,21 +478,41 @@ class PRReviewer:
         """Main PR review function"""
         logger.info(f"Starting review for PR #{pr_number} in {repo_name}")
         
-        # Get PR diff and files
-        diff = self.get_pr_diff(repo_name, pr_number)
-        files = self.get_pr_files(repo_name, pr_number)
+        # Get PR metadata, files and diff (cached per head commit). The two
+        # fetches are independent, so run them concurrently.
+        head_sha = pr_data.get('head', {}).get('sha')
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            bundle_future = executor.submit(self.fetch_pr_bundle, repo_name, pr_number, head_sha)
+            diff_future = executor.submit(self.get_pr_diff, repo_name, pr_number, head_sha)
+            bundle, diff = bundle_future.result(), diff_future.result()
+        files = bundle.get('files', [])
         
         # Perform basic checks
         basic_issues = self.perform_basic_checks(files)
         
         # Analyze with LLM
         pr_info = {
-            'title': pr_data.get('title', ''),
-            'body': pr_data.get('body', ''),
-            'author': pr_data.get('user', {}).get('login', ''),
+            'title': pr_data.get('title') or bundle.get('title', ''),
+            'body': pr_data.get('body') or bundle.get('body', ''),
+            'author': pr_data.get('user', {}).get('login') or bundle.get('author', ''),
         }
         
-        llm_analysis = self.analyze_code_with_llm(diff, files, pr_info)
+        # Skip the LLM, the slowest and costliest step, for bot PRs that only
+        # touch lock files or docs
+        user = pr_data.get('user', {})
+        is_bot = (
+            user.get('type') == 'Bot'
+            or user.get('login', '').endswith('[bot]')
+            or bundle.get('author_is_bot', False)
+        )
+        llm_skipped = bool(files) and is_bot and all(
+            f['filename'].endswith(LOW_VALUE_FILE_SUFFIXES) for f in files
+        )
+        if llm_skipped:
+            logger.info(f"Skipping LLM review for bot PR #{pr_number} in {repo_name}")
+            llm_analysis = "Skipped LLM review (bot/lock-file-only PR)."
+        else:
+            llm_analysis = self.analyze_code_with_llm(diff, files, pr_info)
         
         # Compile review comment
         review_comment = self.compile_review_comment(basic_issues, llm_analysis, files)
@@ -208,14 +524,61 @@ class PRReviewer:
             'success': success,
             'files_analyzed': len(files),
             'basic_issues': len(basic_issues),
+            'llm_skipped': llm_skipped,
             'comment_posted': success
         }
 
+    def review_pr_once(self, repo_name: str, pr_number: int, pr_data: Dict, payload_digest: str) -> Dict:
+        """Review a PR, returning the stored result when the same webhook
+        payload is replayed within REVIEW_REPLAY_TTL seconds. Identical
+        deliveries that arrive while a review is running wait for it."""
+        key = ('review', repo_name, pr_number, payload_digest)
+        with self._cache_lock:
+            pending = self._inflight.get(key)
+            is_owner = pending is None
+            if is_owner:
+                pending = self._inflight[key] = Future()
+        if not is_owner:
+            logger.info(f"Waiting on in-flight review for replayed PR #{pr_number} in {repo_name}")
+            return pending.result()
+        
+        try:
+            result = self._cache_get(key)
+            if result is not None:
+                logger.info(f"Returning cached review for replayed PR #{pr_number} in {repo_name}")
+            else:
+                result = self.review_pr(repo_name, pr_number, pr_data)
+                # Unsuccessful results are kept too: the LLM has already run,
+                # and a replay seconds later would fail the same way
+                self._cache_set(key, result, ttl=REVIEW_REPLAY_TTL)
+            pending.set_result(result)
+            return result
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._cache_lock:
+                self._inflight.pop(key, None)
+
     def compile_review_comment(self, basic_issues: List[str], llm_analysis: str, files: List[Dict]) -> str:
         """Compile the final review comment"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime())
         
-        comment = f"""
+        if basic_issues:
+            checks_block = "\n".join(f"- {issue}" for issue in basic_issues)
+        else:
+            checks_block = "✅ All basic checks passed!"
+        
+        shown_files = files[:10]  # Limit to first 10 files
+        file_lines = [
+            f"- `{file['filename']}` ({file['status']}) - +{file['additions']}/-{file['deletions']}\n"
+            for file in shown_files
+        ]
+        if len(files) > len(shown_files):
+            file_lines.append(f"... and {len(files) - len(shown_files)} more files\n")
+        files_block = "".join(file_lines)
+        
+        return f"""
 ## 🤖 Automated PR Review
 
 **Review completed at:** {timestamp}
@@ -225,54 +588,86 @@ class PRReviewer:
 - **Basic checks:** {'✅ Passed' if not basic_issues else f'⚠️ {len(basic_issues)} issues found'}
 
 ### 🔍 Basic Checks
-"""
-        
-        if basic_issues:
-            comment += "\n".join(f"- {issue}" for issue in basic_issues)
-        else:
-            comment += "✅ All basic checks passed!"
-        
-        comment += f"""
+{checks_block}
 
 ### 🧠 AI Code Analysis
 {llm_analysis}
 
 ### 📝 Files Changed
-"""
-        
-        for file in files[:10]:  # Limit to first 10 files
-            comment += f"- `{file['filename']}` ({file['status']}) - +{file['additions']}/-{file['deletions']}\n"
-        
-        if len(files) > 10:
-            comment += f"... and {len(files) - 10} more files\n"
-        
-        comment += """
+{files_block}
 
 ---
 *This review was generated automatically. Please use your best judgment and consider all feedback carefully.*
 """
-        
-        return comment
 
 
 # Initialize PR reviewer
 pr_reviewer = PRReviewer()
 
+# Background review queue; without Redis, reviews run inline
+review_queue = Queue('pr-reviews', connection=redis_conn) if redis_conn is not None else None
+
+def run_review(repo_name: str, pr_number: int, pr_data: Dict) -> Dict:
+    """Entry point for queued review jobs"""
+    return pr_reviewer.review_pr(repo_name, pr_number, pr_data)
+
+def enqueue_review(repo_name: str, pr_number: int, pr_data: Dict) -> str:
+    """Queue a review, collapsing redeliveries for the same head commit.
+    Returns the job id."""
+    head_sha = pr_data.get('head', {}).get('sha', '')
+    job_id = re.sub(r'[^A-Za-z0-9_-]', '_', f"{repo_name}:{pr_number}:{head_sha}")
+    
+    # Claim the id atomically so near-simultaneous deliveries cannot both
+    # enqueue it. A failed job may be retried by one redelivery: only the
+    # caller whose DELETE removes the old claim can take it again.
+    claim_key = REDIS_CLAIM_PREFIX + job_id
+    if not redis_conn.set(claim_key, 1, nx=True, ex=REVIEW_RESULT_TTL):
+        job = review_queue.fetch_job(job_id)
+        retry = (
+            job is not None
+            and job.get_status() in ('failed', 'stopped', 'canceled')
+            and redis_conn.delete(claim_key)
+            and redis_conn.set(claim_key, 1, nx=True, ex=REVIEW_RESULT_TTL)
+        )
+        if not retry:
+            logger.info(f"Review job {job_id} already exists, skipping")
+            return job_id
+    
+    try:
+        # Enqueue by dotted path: under `python app.py` run_review lives in
+        # __main__, which the worker cannot import
+        review_queue.enqueue(
+            'app.run_review', repo_name, pr_number, pr_data,
+            job_id=job_id,
+            job_timeout=REVIEW_JOB_TIMEOUT,
+            result_ttl=REVIEW_RESULT_TTL
+        )
+    except Exception:
+        redis_conn.delete(claim_key)  # Let a redelivery try again
+        raise
+    return job_id
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': datetime.now(timezone.utc),  # orjson emits ISO 8601
         'github_configured': bool(GITHUB_TOKEN),
-        'openai_configured': bool(OPENAI_API_KEY)
+        'openai_configured': bool(OPENAI_API_KEY),
+        'cache_stats': pr_reviewer.stats
     })
 
 @app.route('/webhook', methods=['POST'])
 def github_webhook():
     """Handle GitHub webhook events"""
     
-    # Verify signature
+    # Reject oversized bodies before reading or hashing them
+    if (request.content_length or 0) > MAX_WEBHOOK_PAYLOAD_BYTES:
+        logger.warning("Webhook payload too large")
+        return jsonify({'error': 'Payload too large'}), 413
+    
+    # Verify signature against the raw body before parsing it
     signature = request.headers.get('X-Hub-Signature-256', '')
     if not pr_reviewer.verify_signature(request.data, signature):
         logger.warning("Invalid webhook signature")
@@ -280,7 +675,7 @@ def github_webhook():
     
     # Parse payload
     try:
-        payload = request.get_json()
+        payload = orjson.loads(request.data)
     except Exception as e:
         logger.error(f"Error parsing webhook payload: {e}")
         return jsonify({'error': 'Invalid JSON payload'}), 400
@@ -294,9 +689,22 @@ def github_webhook():
         if repo_name and pr_number:
             logger.info(f"Processing PR #{pr_number} in {repo_name}")
             
+            # Acknowledge immediately and let a worker do the review
+            if review_queue is not None:
+                try:
+                    job_id = enqueue_review(repo_name, pr_number, pr_data)
+                    return jsonify({
+                        'message': 'PR review queued',
+                        'job_id': job_id
+                    }), 202
+                except Exception as e:
+                    logger.error(f"Error queueing PR review: {e}")
+                    return jsonify({'error': 'Failed to queue review'}), 500
+            
             # Perform review
             try:
-                result = pr_reviewer.review_pr(repo_name, pr_number, pr_data)
+                payload_digest = hashlib.sha256(request.data).hexdigest()
+                result = pr_reviewer.review_pr_once(repo_name, pr_number, pr_data, payload_digest)
                 return jsonify({
                     'message': 'PR review completed',
                     'result': result
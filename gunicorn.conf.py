@@ -0,0 +1,11 @@
+import os
+
+# Reviews spend their time waiting on GitHub and OpenAI, so use gevent
+# workers to overlap concurrent webhook deliveries. The gevent worker
+# monkey-patches the standard library itself before loading the app, so
+# app.py (also imported by handler.py and RQ workers) does not patch.
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+worker_class = 'gevent'
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+worker_connections = 1000
+timeout = 120
@@ -1,108 +1,107 @@
-import json
 import os
-import sys
+import orjson
 from flask import Flask, request, jsonify
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Share the main application's reviewer (and its caches and HTTP pool)
+from app import MAX_WEBHOOK_PAYLOAD_BYTES, OrjsonProvider, pr_reviewer
 
 # OpenFaaS function handler
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+app.config['MAX_CONTENT_LENGTH'] = MAX_WEBHOOK_PAYLOAD_BYTES
 
-# Import our main application logic
-from app import PRReviewer, github_client
-
-# Initialize PR reviewer
-pr_reviewer = PRReviewer()
+def _health():
+    """Health check"""
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now(timezone.utc),
+        'platform': 'openfaas',
+        'function': 'pr-reviewer',
+        'github_configured': bool(os.getenv('github_token')),  # OpenFaaS secret
+        'openai_configured': bool(os.getenv('openai_api_key'))   # OpenFaaS secret
+    })
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
-def handle(path=''):
-    """
-    OpenFaaS function handler that routes all requests
-    """
-    
-    # Health check
-    if request.method == 'GET' and (path == '' or path == 'health'):
-        return jsonify({
-            'status': 'healthy',
-            'timestamp': datetime.now().isoformat(),
-            'platform': 'openfaas',
-            'function': 'pr-reviewer',
-            'github_configured': bool(os.getenv('github_token')),  # OpenFaaS secret
-            'openai_configured': bool(os.getenv('openai_api_key'))   # OpenFaaS secret
-        })
-    
-    # Handle GitHub webhook
-    if request.method == 'POST' and path in ['', 'webhook']:
+def _webhook():
+    """Handle GitHub webhook"""
+    try:
+        # Reject oversized bodies before reading or hashing them
+        if (request.content_length or 0) > MAX_WEBHOOK_PAYLOAD_BYTES:
+            return jsonify({'error': 'Payload too large'}), 413
+        
+        # Verify signature against the raw body before parsing it
+        signature = request.headers.get('X-Hub-Signature-256', '')
+        if not pr_reviewer.verify_signature(request.data, signature):
+            return jsonify({'error': 'Invalid signature'}), 401
+        
+        # Get the payload
         try:
-            # Get the payload
-            payload = request.get_json()
-            if not payload:
-                return jsonify({'error': 'No JSON payload'}), 400
+            payload = orjson.loads(request.data)
+        except orjson.JSONDecodeError:
+            payload = None
+        if not payload:
+            return jsonify({'error': 'No JSON payload'}), 400
+        
+        # Process PR events
+        if payload.get('action') in ['opened', 'synchronize', 'reopened']:
+            pr_data = payload.get('pull_request', {})
+            repo_name = payload.get('repository', {}).get('full_name', '')
+            pr_number = pr_data.get('number')
             
-            # Verify signature
-            signature = request.headers.get('X-Hub-Signature-256', '')
-            if not pr_reviewer.verify_signature(request.data, signature):
-                return jsonify({'error': 'Invalid signature'}), 401
-            
-            # Process PR events
-            if payload.get('action') in ['opened', 'synchronize', 'reopened']:
-                pr_data = payload.get('pull_request', {})
-                repo_name = payload.get('repository', {}).get('full_name', '')
-                pr_number = pr_data.get('number')
+            if repo_name and pr_number:
+                # Perform the review
+                result = pr_reviewer.review_pr(repo_name, pr_number, pr_data)
                 
-                if repo_name and pr_number:
-                    # Perform the review
-                    result = pr_reviewer.review_pr(repo_name, pr_number, pr_data)
-                    
-                    return jsonify({
-                        'message': 'PR review completed successfully',
-                        'repository': repo_name,
-                        'pr_number': pr_number,
-                        'result': result,
-                        'timestamp': datetime.now().isoformat()
-                    })
-                else:
-                    return jsonify({'error': 'Missing repository or PR number'}), 400
-            else:
-                # Acknowledge other events
                 return jsonify({
-                    'message': f'Event {payload.get("action", "unknown")} acknowledged but not processed'
+                    'message': 'PR review completed successfully',
+                    'repository': repo_name,
+                    'pr_number': pr_number,
+                    'result': result,
+                    'timestamp': datetime.now(timezone.utc)
                 })
-                
-        except Exception as e:
-            return jsonify({
-                'error': 'Internal server error',
-                'details': str(e),
-                'timestamp': datetime.now().isoformat()
-            }), 500
-    
-    # Handle manual review requests
-    if request.method == 'POST' and path == 'review':
-        try:
-            data = request.get_json()
-            if not data or 'repo' not in data or 'pr_number' not in data:
-                return jsonify({'error': 'Missing repo or pr_number'}), 400
-            
-            result = pr_reviewer.review_pr(
-                data['repo'], 
-                data['pr_number'], 
-                data.get('pr_data', {})
-            )
-            
+            else:
+                return jsonify({'error': 'Missing repository or PR number'}), 400
+        else:
+            # Acknowledge other events
             return jsonify({
-                'message': 'Manual review completed',
-                'result': result,
-                'timestamp': datetime.now().isoformat()
+                'message': f'Event {payload.get("action", "unknown")} acknowledged but not processed'
             })
             
-        except Exception as e:
-            return jsonify({
-                'error': 'Review failed',
-                'details': str(e),
-                'timestamp': datetime.now().isoformat()
-            }), 500
-    
-    # Default response for unknown routes
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'details': str(e),
+            'timestamp': datetime.now(timezone.utc)
+        }), 500
+
+def _manual_review():
+    """Handle manual review requests"""
+    try:
+        data = request.get_json()
+        if not data or 'repo' not in data or 'pr_number' not in data:
+            return jsonify({'error': 'Missing repo or pr_number'}), 400
+        
+        result = pr_reviewer.review_pr(
+            data['repo'], 
+            data['pr_number'], 
+            data.get('pr_data', {})
+        )
+        
+        return jsonify({
+            'message': 'Manual review completed',
+            'result': result,
+            'timestamp': datetime.now(timezone.utc)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'error': 'Review failed',
+            'details': str(e),
+            'timestamp': datetime.now(timezone.utc)
+        }), 500
+
+def _not_found(path):
+    """Default response for unknown routes"""
     return jsonify({
         'error': 'Not found',
         'method': request.method,
@@ -114,6 +113,24 @@ def handle(path=''):
         ]
     }), 404
 
+# (method, path) -> handler, so dispatch is a single dict lookup
+_ROUTES = {
+    ('GET', ''): _health,
+    ('GET', 'health'): _health,
+    ('POST', ''): _webhook,
+    ('POST', 'webhook'): _webhook,
+    ('POST', 'review'): _manual_review,
+}
+
+@app.route('/', defaults={'path': ''}, methods=['GET', 'POST', 'PUT', 'DELETE'])
+@app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+def handle(path=''):
+    """
+    OpenFaaS function handler that routes all requests
+    """
+    route = _ROUTES.get((request.method, path))
+    return route() if route else _not_found(path)
+
 if __name__ == '__main__':
     # For OpenFaaS, we run on port 5000
     app.run(host='0.0.0.0', port=5000, debug=False) 
\ No newline at end of file
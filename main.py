@@ -1,12 +1,39 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+# Reuse one pooled connection to api.github.com for every call
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20, pool_maxsize=20, max_retries=Retry(total=3, backoff_factor=0.3)))
+
+# ETag and body of every response, keyed by URL and query parameters
+_ETAGS = {}
+
+
+def github_get(url, params=None):
+    """GET a GitHub resource, sending If-None-Match so unchanged data comes
+    back as a 304 that does not count against the rate limit"""
+    key = (url, tuple(sorted((params or {}).items())))
+    cached = _ETAGS.get(key)
+    headers = dict(HEADERS)
+    if cached:
+        headers["If-None-Match"] = cached[0]
+
+    response = SESSION.get(url, headers=headers, params=params)
+    if response.status_code == 304 and cached:
+        return cached[1]
+
+    body = response.json()
+    if response.headers.get("ETag"):
+        _ETAGS[key] = (response.headers["ETag"], body)
+    return body
 
 
 
 def get_repo_details():
     url = f"https://api.github.com/repos/{OWNER}/{REPO}"
-    response = requests.get(url, headers=HEADERS)
-    return response.json()
+    return github_get(url)
 
 # ---- Fetch All Pull Requests ----
 
@@ -14,32 +41,28 @@ def get_repo_details():
 def get_pull_requests(state="open"):
     url = f"https://api.github.com/repos/{OWNER}/{REPO}/pulls"
     params = {"state": state}
-    response = requests.get(url, headers=HEADERS, params=params)
-    return response.json()
+    return github_get(url, params)
 
 # ---- Fetch Single PR Details ----
 
 
 def get_pr_details(pr_number):
     url = f"https://api.github.com/repos/{OWNER}/{REPO}/pulls/{pr_number}"
-    response = requests.get(url, headers=HEADERS)
-    return response.json()
+    return github_get(url)
 
 # ---- Fetch All Issues (including PRs) ----
 
 
 def get_issues():
     url = f"https://api.github.com/repos/{OWNER}/{REPO}/issues"
-    response = requests.get(url, headers=HEADERS)
-    return response.json()
+    return github_get(url)
 
 # ---- Fetch All Commits ----
 
 
 def get_commits():
     url = f"https://api.github.com/repos/{OWNER}/{REPO}/commits"
-    response = requests.get(url, headers=HEADERS)
-    return response.json()
+    return github_get(url)
 
 
 # ---- MAIN ----
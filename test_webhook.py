@@ -3,166 +3,263 @@
 Test script to simulate GitHub webhook events for testing the PR reviewer application.
 """
 
-import requests
-import json
+import asyncio
+import httpx
+import orjson
 import hmac
-import hashlib
 import os
-from datetime import datetime
+import time
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
-WEBHOOK_URL = "http://localhost:8080/webhook"
+BASE_URL = os.environ.get("PR_REVIEWER_URL", "http://localhost:8080")
+WEBHOOK_URL = f"{BASE_URL}/webhook"
+MANUAL_REVIEW_URL = f"{BASE_URL}/review"
+HEALTH_CHECK_URL = f"{BASE_URL}/health"
+REQUEST_TIMEOUT = 120  # Inline reviews can take a while; matches gunicorn's worker timeout
+VERBOSE = os.environ.get("VERBOSE") == "1"  # Print payloads and response bodies
+LOAD_REQUESTS = max(0, int(os.environ.get("LOAD_REQUESTS", "0")))  # Fire N webhooks instead of the tests
+# Max requests in flight; at least 1, since a zero-slot semaphore never lets one start
+LOAD_CONCURRENCY = max(1, int(os.environ.get("LOAD_CONCURRENCY", "100")))
 WEBHOOK_SECRET = "your_test_webhook_secret"  # Should match your .env file
 
-def create_signature(payload_body: str, secret: str) -> str:
-    """Create GitHub webhook signature"""
-    signature = hmac.new(
-        secret.encode('utf-8'),
-        payload_body.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
-    return f"sha256={signature}"
+def emit(lines):
+    """Write a test's output with a single call, so concurrent tests do not interleave"""
+    sys.stdout.write("\n".join(lines) + "\n")
 
-def test_pr_opened_webhook():
-    """Test PR opened webhook event"""
-    
-    # Sample PR opened payload
-    payload = {
-        "action": "opened",
+# One pooled client so every test reuses the connection to the app. HTTP/2 is
+# negotiated over TLS (an https PR_REVIEWER_URL behind a proxy), letting the
+# concurrent tests multiplex over a single connection; plain http stays on
+# HTTP/1.1, where keep-alive is already the default. An explicit
+# "Connection: keep-alive" header is deliberately not sent: HTTP/2 forbids
+# connection-specific headers. Idle connections are kept open for the whole
+# run and closed explicitly at exit.
+CLIENT = httpx.Client(
+    headers={"User-Agent": "GitHub-Hookshot/test"},
+    timeout=REQUEST_TIMEOUT,
+    transport=httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=30),
+    ),
+)
+
+# The secret is constant, so encode it once
+_SECRET_BYTES = WEBHOOK_SECRET.encode('utf-8')
+
+def create_signature(payload_body) -> str:
+    """Create GitHub webhook signature for a bytes or str payload"""
+    if isinstance(payload_body, bytes):
+        msg = payload_body
+    else:
+        msg = payload_body.encode('utf-8')
+    # hmac.digest is a single one-shot OpenSSL call, with no HMAC object
+    return "sha256=" + hmac.digest(_SECRET_BYTES, msg, "sha256").hex()
+
+# Fixture timestamp. Its exact value is irrelevant, and a fixed literal keeps
+# the signed body identical across runs so the server can spot replays
+_CREATED_AT = "2024-01-01T00:00:00Z"
+
+# Sample PR opened payload. It never changes, so it is serialized and signed
+# once at import; the dict itself is not kept, leaving no encoder work per run
+PR_OPENED_BODY = orjson.dumps({
+    "action": "opened",
+    "number": 123,
+    "pull_request": {
         "number": 123,
-        "pull_request": {
-            "number": 123,
-            "title": "Add new feature for user authentication",
-            "body": "This PR adds JWT-based authentication to the user management system.",
-            "state": "open",
-            "user": {
-                "login": "developer123"
-            },
-            "head": {
-                "sha": "abc123def456"
-            },
-            "base": {
-                "sha": "def456ghi789"
-            },
-            "diff_url": "https://api.github.com/repos/owner/repo/pulls/123.diff",
-            "created_at": datetime.now().isoformat()
+        "title": "Add new feature for user authentication",
+        "body": "This PR adds JWT-based authentication to the user management system.",
+        "state": "open",
+        "user": {
+            "login": "developer123"
         },
-        "repository": {
-            "full_name": "owner/test-repo",
-            "name": "test-repo",
-            "owner": {
-                "login": "owner"
-            }
+        "head": {
+            "sha": "abc123def456"
         },
-        "sender": {
-            "login": "developer123"
+        "base": {
+            "sha": "def456ghi789"
+        },
+        "diff_url": "https://api.github.com/repos/owner/repo/pulls/123.diff",
+        "created_at": _CREATED_AT
+    },
+    "repository": {
+        "full_name": "owner/test-repo",
+        "name": "test-repo",
+        "owner": {
+            "login": "owner"
         }
+    },
+    "sender": {
+        "login": "developer123"
     }
+})
+
+PR_OPENED_HEADERS = {
+    "Content-Type": "application/json",
+    "X-GitHub-Event": "pull_request",
+    "X-Hub-Signature-256": create_signature(PR_OPENED_BODY),
+}
+
+def test_pr_opened_webhook():
+    """Test PR opened webhook event"""
+    lines = []
     
-    payload_json = json.dumps(payload)
-    signature = create_signature(payload_json, WEBHOOK_SECRET)
-    
-    headers = {
-        "Content-Type": "application/json",
-        "X-GitHub-Event": "pull_request",
-        "X-Hub-Signature-256": signature,
-        "User-Agent": "GitHub-Hookshot/test"
-    }
-    
-    print("🧪 Testing PR opened webhook...")
-    print(f"URL: {WEBHOOK_URL}")
-    print(f"Payload: {json.dumps(payload, indent=2)}")
+    lines.append("🧪 Testing PR opened webhook...")
+    lines.append(f"URL: {WEBHOOK_URL}")
+    if VERBOSE:
+        lines.append(f"Payload: {orjson.dumps(orjson.loads(PR_OPENED_BODY), option=orjson.OPT_INDENT_2).decode()}")
     
     try:
-        response = requests.post(WEBHOOK_URL, data=payload_json, headers=headers)
+        response = CLIENT.post(WEBHOOK_URL, content=PR_OPENED_BODY, headers=PR_OPENED_HEADERS)
         
-        print(f"\n📊 Response:")
-        print(f"Status Code: {response.status_code}")
-        print(f"Response Body: {response.text}")
+        lines.append(f"\n📊 Response:")
+        lines.append(f"Status Code: {response.status_code}")
+        if VERBOSE:
+            lines.append(f"Response Body: {response.content.decode('utf-8', errors='replace')}")
         
         if response.status_code == 200:
-            print("✅ Webhook test successful!")
+            lines.append("✅ Webhook test successful!")
         else:
-            print("❌ Webhook test failed!")
+            lines.append("❌ Webhook test failed!")
             
-    except requests.exceptions.ConnectionError:
-        print("❌ Could not connect to webhook URL. Make sure the application is running.")
+    except httpx.ConnectError:
+        lines.append("❌ Could not connect to webhook URL. Make sure the application is running.")
     except Exception as e:
-        print(f"❌ Error testing webhook: {e}")
+        lines.append(f"❌ Error testing webhook: {e}")
+    
+    emit(lines)
 
-def test_manual_review():
-    """Test manual review endpoint"""
+async def load_test_webhook(total, concurrency):
+    """Fire the PR opened webhook total times from one event loop"""
+    # Every request carries the same signed body. Inline, each server worker
+    # runs one review per REVIEW_REPLAY_TTL window and the identical
+    # deliveries share its result; with REDIS_URL set they collapse onto
+    # one queued job
+    in_flight = asyncio.Semaphore(concurrency)
+    statuses = {}
+    errors = 0
+    
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, headers=CLIENT.headers) as client:
+        async def fire():
+            nonlocal errors
+            async with in_flight:
+                try:
+                    response = await client.post(WEBHOOK_URL, content=PR_OPENED_BODY, headers=PR_OPENED_HEADERS)
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        
+        started = time.perf_counter()
+        await asyncio.gather(*[fire() for _ in range(total)])
+        elapsed = time.perf_counter() - started
     
-    payload = {
-        "repo": "owner/test-repo",
-        "pr_number": 123,
-        "pr_data": {
-            "title": "Add new feature for user authentication",
-            "body": "This PR adds JWT-based authentication to the user management system.",
-            "user": {
-                "login": "developer123"
-            }
+    lines = [f"🔥 Load test: {total} webhooks to {WEBHOOK_URL} ({concurrency} in flight)"]
+    lines.append(f"Elapsed: {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    for status, count in sorted(statuses.items()):
+        lines.append(f"Status {status}: {count}")
+    if errors:
+        lines.append(f"❌ Connection errors: {errors}")
+    emit(lines)
+
+def run_load_test(total, concurrency):
+    """Run the load test, on uvloop when it is installed"""
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(load_test_webhook(total, concurrency))
+        return
+    if hasattr(uvloop, "run"):  # uvloop >= 0.18
+        uvloop.run(load_test_webhook(total, concurrency))
+    else:
+        uvloop.install()
+        asyncio.run(load_test_webhook(total, concurrency))
+
+# Manual review request body, serialized once at import
+_MANUAL_REVIEW_BODY = orjson.dumps({
+    "repo": "owner/test-repo",
+    "pr_number": 123,
+    "pr_data": {
+        "title": "Add new feature for user authentication",
+        "body": "This PR adds JWT-based authentication to the user management system.",
+        "user": {
+            "login": "developer123"
         }
     }
+})
+_MANUAL_REVIEW_HEADERS = {"Content-Type": "application/json"}
+
+def test_manual_review():
+    """Test manual review endpoint"""
+    lines = []
     
-    print("\n🧪 Testing manual review endpoint...")
-    print(f"URL: http://localhost:8080/review")
+    lines.append("\n🧪 Testing manual review endpoint...")
+    lines.append(f"URL: {MANUAL_REVIEW_URL}")
     
     try:
-        response = requests.post(
-            "http://localhost:8080/review",
-            json=payload,
-            headers={"Content-Type": "application/json"}
+        response = CLIENT.post(
+            MANUAL_REVIEW_URL,
+            content=_MANUAL_REVIEW_BODY,
+            headers=_MANUAL_REVIEW_HEADERS
         )
         
-        print(f"\n📊 Response:")
-        print(f"Status Code: {response.status_code}")
-        print(f"Response Body: {response.text}")
+        lines.append(f"\n📊 Response:")
+        lines.append(f"Status Code: {response.status_code}")
+        if VERBOSE:
+            lines.append(f"Response Body: {response.content.decode('utf-8', errors='replace')}")
         
         if response.status_code == 200:
-            print("✅ Manual review test successful!")
+            lines.append("✅ Manual review test successful!")
         else:
-            print("❌ Manual review test failed!")
+            lines.append("❌ Manual review test failed!")
             
-    except requests.exceptions.ConnectionError:
-        print("❌ Could not connect to review URL. Make sure the application is running.")
+    except httpx.ConnectError:
+        lines.append("❌ Could not connect to review URL. Make sure the application is running.")
     except Exception as e:
-        print(f"❌ Error testing manual review: {e}")
+        lines.append(f"❌ Error testing manual review: {e}")
+    
+    emit(lines)
 
 def test_health_check():
     """Test health check endpoint"""
+    lines = []
     
-    print("\n🧪 Testing health check...")
+    lines.append("\n🧪 Testing health check...")
     
     try:
-        response = requests.get("http://localhost:8080/health")
+        response = CLIENT.get(HEALTH_CHECK_URL)
         
-        print(f"📊 Response:")
-        print(f"Status Code: {response.status_code}")
-        print(f"Response Body: {response.text}")
+        lines.append(f"📊 Response:")
+        lines.append(f"Status Code: {response.status_code}")
+        if VERBOSE:
+            lines.append(f"Response Body: {response.content.decode('utf-8', errors='replace')}")
         
         if response.status_code == 200:
-            print("✅ Health check successful!")
+            lines.append("✅ Health check successful!")
         else:
-            print("❌ Health check failed!")
+            lines.append("❌ Health check failed!")
             
-    except requests.exceptions.ConnectionError:
-        print("❌ Could not connect to health endpoint. Make sure the application is running.")
+    except httpx.ConnectError:
+        lines.append("❌ Could not connect to health endpoint. Make sure the application is running.")
     except Exception as e:
-        print(f"❌ Error testing health check: {e}")
+        lines.append(f"❌ Error testing health check: {e}")
+    
+    emit(lines)
 
 if __name__ == "__main__":
     print("🚀 Starting PR Reviewer Application Tests")
     print("=" * 50)
     
-    # Test health check first
-    test_health_check()
-    
-    # Test manual review
-    test_manual_review()
-    
-    # Test webhook
-    test_pr_opened_webhook()
+    if LOAD_REQUESTS:
+        with CLIENT:
+            run_load_test(LOAD_REQUESTS, LOAD_CONCURRENCY)
+    else:
+        # The tests are independent, so run them concurrently on the shared client
+        tests = [test_health_check, test_manual_review, test_pr_opened_webhook]
+        # Closing the client drops the kept-alive connections even if a test raises
+        with CLIENT, ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            list(executor.map(lambda test: test(), tests))
     
     print("\n" + "=" * 50)
     print("🏁 Tests completed!")